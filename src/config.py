@@ -1,3 +1,4 @@
+import functools
 import os
 from dataclasses import dataclass
 from typing import Optional
@@ -8,26 +9,46 @@ from dotenv import load_dotenv
 @dataclass
 class Config:
     """Configuration for Smart Ingest."""
-    
+
     api_key: Optional[str]
     gemini_model: str
     max_depth: int
+    max_entries: int
+    max_tree_bytes: int
     retries: int
+    use_cache: bool
+    repo_cache: bool
+    no_auto_exclude: bool
+
+
+@functools.lru_cache(maxsize=1)
+def _load_environment() -> tuple[Optional[str], str]:
+    """Parse .env and read Gemini settings from the environment once.
+
+    load_dotenv re-parses the .env file from disk and every os.getenv call
+    scans the environ block, so the results are cached per process.
+    """
+    load_dotenv()
+    return os.getenv("GEMINI_API_KEY"), os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
 
 def load_config(args) -> Config:
     """Load configuration from environment and arguments."""
-    load_dotenv()
-    
-    api_key = args.api_key or os.getenv("GEMINI_API_KEY")
-    default_model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-    
+    env_api_key, default_model = _load_environment()
+
+    api_key = args.api_key or env_api_key
+
     if not args.no_auto_exclude and not api_key:
         print("Warning: --no-auto-exclude not set, but no Gemini API key found. Disabling automatic excludes.")
-    
+
     return Config(
         api_key=api_key,
         gemini_model=args.gemini_model or default_model,
         max_depth=args.max_depth,
-        retries=args.retries
-    )
\ No newline at end of file
+        max_entries=args.max_entries,
+        max_tree_bytes=args.max_tree_bytes,
+        retries=args.retries,
+        use_cache=not args.no_cache,
+        repo_cache=args.repo_cache,
+        no_auto_exclude=args.no_auto_exclude
+    )
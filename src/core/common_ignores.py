@@ -0,0 +1,31 @@
+"""Baked-in exclude patterns for directories that are never worth ingesting."""
+
+# Entry name (as seen in a directory listing) -> exclude pattern. The
+# tree walk prunes these names at *any* depth (and the Gemini prescan
+# strips their lines from the prompt), so every pattern must match at
+# any depth too — a root-anchored "node_modules/" would leave a nested
+# frontend/node_modules/ hidden from Gemini yet not excluded.
+COMMON_IGNORE_PATTERNS = {
+    ".git": "**/.git/",
+    ".svn": "**/.svn/",
+    ".hg": "**/.hg/",
+    "__pycache__": "**/__pycache__/",
+    "node_modules": "**/node_modules/",
+    "venv": "**/venv/",
+    ".venv": "**/.venv/",
+    "dist": "**/dist/",
+    "build": "**/build/",
+    "target": "**/target/",
+    ".tox": "**/.tox/",
+    ".pytest_cache": "**/.pytest_cache/",
+    ".mypy_cache": "**/.mypy_cache/",
+    ".idea": "**/.idea/",
+    ".vscode": "**/.vscode/",
+    ".DS_Store": "**/.DS_Store",
+    "Thumbs.db": "**/Thumbs.db",
+}
+
+# The pattern side of the table, for seeding an exclude set directly.
+# These apply whether or not Gemini is available, so the obvious 90% of
+# excludes never depend on an LLM round-trip.
+COMMON_IGNORES: frozenset = frozenset(COMMON_IGNORE_PATTERNS.values())
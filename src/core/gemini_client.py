@@ -1,44 +1,121 @@
 """Gemini API client for generating exclude patterns."""
 
 import asyncio
-import re
+import functools
+import hashlib
+import json
+import random
 import sys
-from typing import Optional
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional, Union
 
-import google.generativeai as genai
-from pydantic import BaseModel, Field, field_validator
+from core.common_ignores import COMMON_IGNORE_PATTERNS
 
+# google.generativeai is a multi-hundred-ms import; it is loaded lazily so
+# --help/--dry-run/--no-auto-exclude paths never pay for it.
+_genai = None
+
+# Quotes and backticks are never legitimate pattern characters; one
+# C-level translate pass drops them all, replacing per-pattern trims.
+_QUOTE_TABLE = str.maketrans('', '', '\'"`')
+
+# Entry names whose exclusion needs no LLM judgement. A cheap prescan
+# over the tree text handles these deterministically; Gemini is only
+# consulted for the ambiguous remainder.
+_STATIC_EXCLUDES = COMMON_IGNORE_PATTERNS
+
+# On-disk cache of generated pattern sets, keyed by a hash of the full
+# prompt (tree + system prompt + model). Re-running on an unchanged repo
+# skips the Gemini round-trip entirely.
+_CACHE_DIR = Path.home() / ".cache" / "smart-ingest"
+
+# Per-request deadline so a hung Gemini call can't block the CLI forever.
+_REQUEST_TIMEOUT = 30.0
+
+# Frozen prompt template halves; built once so per-call (and per-batch-
+# entry) prompt assembly is a single join with no literal rebuilds.
+_PROMPT_PREFIX = (
+    "Analyze the following directory structure and generate a single comma-separated "
+    "line of exclude patterns based *only* on the items present. Follow the exclusion "
+    "guidelines strictly.\n\n"
+    "Directory structure:\n```\n"
+)
+_PROMPT_SUFFIX = "\n```\n\nExclude patterns:"
+
+
+def _get_genai():
+    """Import google.generativeai on first use and cache the module."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        _genai = genai
+    return _genai
+
+
+@dataclass(slots=True)
+class ExcludePatterns:
+    """Cleaned exclude patterns parsed from a Gemini response."""
+
+    patterns: list[str]
+
+
+@functools.lru_cache(maxsize=1)
+def _transient_api_exceptions() -> tuple[type[BaseException], ...]:
+    """Exception types worth retrying (quota, outage, deadline)."""
+    try:
+        from google.api_core import exceptions as api_exceptions
+    except ImportError:
+        return ()
+    return (
+        api_exceptions.ResourceExhausted,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.DeadlineExceeded,
+    )
 
-class ExcludePatterns(BaseModel):
-    """Model for exclude patterns."""
-    
-    patterns: list[str] = Field(description="List of exclude patterns as strings")
-    
-    @field_validator('patterns', mode='before')
-    @classmethod
-    def parse_and_clean_patterns(cls, v):
-        """Validate and clean patterns from string or list."""
-        raw_patterns = []
-        
-        if isinstance(v, str):
-            # Remove code block markers and split comma-separated string
-            cleaned_str = re.sub(r'(^```[a-zA-Z]*\s*|\s*```$)', '', v, flags=re.MULTILINE).strip()
-            raw_patterns = [p.strip() for p in cleaned_str.split(',') if p.strip()]
-        elif isinstance(v, list):
-            raw_patterns = [str(p).strip() for p in v if str(p).strip()]
-        else:
-            raise ValueError("Patterns must be a string or list")
-        
-        # Clean each pattern
-        valid_patterns = []
-        for pattern in raw_patterns:
-            cleaned_pattern = pattern.strip('\'"` ')
-            if cleaned_pattern:
-                # Normalize path separators, especially double slashes
-                normalized_pattern = cleaned_pattern.replace('//', '/')
-                valid_patterns.append(normalized_pattern)
-        
-        return valid_patterns
+
+def _strip_code_fences(s: str) -> str:
+    """Drop a leading/trailing ``` fence without invoking the regex engine.
+
+    Responses are usually fence-free, so the common case is two failed
+    prefix/suffix checks and no other work.
+    """
+    s = s.strip()
+    if s.startswith('```'):
+        newline = s.find('\n')
+        s = s[newline + 1:] if newline != -1 else s[3:]
+    if s.endswith('```'):
+        s = s[:-3]
+    return s.strip()
+
+
+def parse_exclude_patterns(v: Union[str, list[str]]) -> list[str]:
+    """Parse and clean exclude patterns from a raw string or list.
+
+    Accepts Gemini's comma-separated response (possibly wrapped in code
+    fences) or an already-split list, and returns stripped, slash-
+    normalized patterns.
+    """
+    if isinstance(v, str):
+        # One translate pass over the whole response drops quote chars,
+        # one replace normalizes double slashes, then split/strip.
+        cleaned = _strip_code_fences(v).translate(_QUOTE_TABLE).replace('//', '/')
+        return [p for p in (part.strip() for part in cleaned.split(',')) if p]
+    elif isinstance(v, list):
+        # Hot path for programmatic reuse: an already-clean list needs no
+        # rebuild. The all() scan short-circuits on the first dirty entry.
+        if all(
+            isinstance(p, str) and p and p == p.strip()
+            and "'" not in p and '"' not in p and '`' not in p and '//' not in p
+            for p in v
+        ):
+            return v
+        cleaned_parts = (
+            str(p).translate(_QUOTE_TABLE).replace('//', '/').strip() for p in v
+        )
+        return [p for p in cleaned_parts if p]
+    else:
+        raise ValueError("Patterns must be a string or list")
 
 
 SYSTEM_PROMPT = """
@@ -101,21 +178,92 @@ Example output format for the above structure: `.git/, frontend/node_modules/, f
 """
 
 
+# API key the SDK was last configured with; genai.configure mutates global
+# SDK state, so it is skipped when the key is unchanged.
+_configured_key = None
+
+
+@functools.lru_cache(maxsize=4)
+def _get_model(api_key: str, model_name: str):
+    """Configure the SDK and build a GenerativeModel, cached per key/model.
+
+    Library configuration and model construction only happen once per
+    (api_key, model_name) pair, however many generator instances or
+    retries a session goes through.
+    """
+    global _configured_key
+    genai = _get_genai()
+    if api_key != _configured_key:
+        genai.configure(api_key=api_key)
+        _configured_key = api_key
+    return genai.GenerativeModel(
+        model_name=model_name,
+        system_instruction=SYSTEM_PROMPT,
+        generation_config={
+            "temperature": 0.1,
+            "max_output_tokens": 1024,
+        }
+    )
+
+
 class GeminiExcludePatternGenerator:
     """Gemini API client for generating exclude patterns."""
     
-    def __init__(self, api_key: str, model_name: str, retries: int = 3):
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        retries: int = 3,
+        use_cache: bool = True,
+        batch_mode: bool = False,
+        llm_refine: bool = True,
+    ):
         self.api_key = api_key
         self.model_name = model_name
         self.retries = retries
+        self.use_cache = use_cache
+        # When False, only the deterministic prescan runs; no API call.
+        self.llm_refine = llm_refine
+        # Opt-in: route multi-tree workloads through the server-side batch
+        # API (cheaper, minute-scale latency) when the SDK provides one.
+        self.batch_mode = batch_mode
         self.model = None
         
-    async def generate_patterns(self, directory_structure: str) -> Optional[set[str]]:
-        """Generate exclude patterns using Gemini API."""
+    def configure(self) -> bool:
+        """Configure the SDK and build the model ahead of time.
+
+        Safe to call concurrently with other startup work (e.g. a repo
+        clone); generate_patterns reuses the already-built model.
+        """
+        return self._configure_api()
+    
+    async def generate_patterns(
+        self, directory_structure: Union[str, Iterable[str]]
+    ) -> Optional[set[str]]:
+        """Generate exclude patterns using Gemini API.
+
+        ``directory_structure`` may be a fully rendered tree string or an
+        iterable of tree lines (e.g. DirectoryAnalyzer.iter_directory_tree),
+        in which case the lines are joined straight into the prompt without
+        an intermediate full-tree string.
+        """
+        if not isinstance(directory_structure, str):
+            directory_structure = "".join(directory_structure)
+        
+        static_patterns, reduced_structure = self._prescan_and_reduce(directory_structure)
+        if not self.llm_refine:
+            return static_patterns or None
+        
         if not self._configure_api():
-            return None
+            return static_patterns or None
+        
+        genai = _get_genai()
+        prompt = self._create_prompt(reduced_structure)
         
-        prompt = self._create_prompt(directory_structure)
+        cache_path = self._cache_path(prompt) if self.use_cache else None
+        if cache_path is not None and (cached := self._read_cache(cache_path)) is not None:
+            print(f"Using cached exclude patterns ({cache_path.name}).")
+            return cached
         
         for attempt in range(self.retries):
             print(f"Calling Gemini API (Attempt {attempt + 1}/{self.retries})...")
@@ -123,58 +271,212 @@ class GeminiExcludePatternGenerator:
             try:
                 response = await self._call_api(prompt)
                 if response:
+                    response |= static_patterns
+                    if cache_path is not None:
+                        self._write_cache(cache_path, response)
                     return response
                 
             except genai.types.generation_types.BlockedPromptException as e:
                 print(f"Attempt {attempt + 1}: Gemini API call failed due to blocked prompt: {e}", file=sys.stderr)
                 break
+            except asyncio.TimeoutError:
+                print(f"Attempt {attempt + 1}: Gemini API call timed out after {_REQUEST_TIMEOUT:.0f}s.", file=sys.stderr)
             except Exception as e:
                 print(f"Attempt {attempt + 1}: Error calling Gemini API: {str(e)}", file=sys.stderr)
-                if attempt < self.retries - 1:
-                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                if not isinstance(e, _transient_api_exceptions()):
+                    # Auth errors, bad requests etc. won't heal on retry;
+                    # don't burn the backoff sleeps on them.
+                    break
+            
+            if attempt < self.retries - 1:
+                # Exponential backoff with jitter so concurrent runs don't
+                # retry in lockstep.
+                await asyncio.sleep(2 ** attempt + random.random())
         
         print("Failed to generate valid exclude patterns from Gemini API after all attempts.", file=sys.stderr)
-        return None
+        return static_patterns or None
+    
+    async def generate_patterns_batch(
+        self, structures: list[str], max_concurrency: int = 8
+    ) -> list[Optional[set[str]]]:
+        """Generate exclude patterns for several directory structures at once.
+
+        Requests are issued concurrently via asyncio.gather so N trees pay
+        roughly one network round-trip instead of N, with an
+        asyncio.Semaphore keeping at most max_concurrency requests in
+        flight (quota-friendly under large batches). Results come back in
+        input order; a failed entry yields None like generate_patterns.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def bounded(structure):
+            async with semaphore:
+                return await self.generate_patterns(structure)
+        
+        results = await asyncio.gather(
+            *(bounded(structure) for structure in structures),
+            return_exceptions=True
+        )
+        return [r if isinstance(r, set) else None for r in results]
+    
+    async def generate_patterns_batch_job(
+        self, structures: list[str]
+    ) -> list[Optional[set[str]]]:
+        """Generate patterns for many trees via the server-side batch API.
+
+        Batch mode trades latency (jobs are polled until done) for ~half
+        the cost of synchronous calls, which suits non-interactive bulk
+        runs. When batch_mode is off or the installed SDK has no batch
+        endpoint, this transparently falls back to the concurrent
+        generate_patterns_batch path.
+        """
+        genai = _get_genai()
+        batches = getattr(genai, "batches", None)
+        if not self.batch_mode or batches is None or not self._configure_api():
+            return await self.generate_patterns_batch(structures)
+        
+        prompts = [self._create_prompt(structure) for structure in structures]
+        try:
+            job = await asyncio.to_thread(
+                batches.create,
+                model=self.model_name,
+                requests=[{"contents": prompt} for prompt in prompts],
+            )
+            while job.state.name not in ("SUCCEEDED", "FAILED", "CANCELLED"):
+                await asyncio.sleep(5)
+                job = await asyncio.to_thread(batches.get, name=job.name)
+            
+            if job.state.name != "SUCCEEDED":
+                print(f"Batch job ended in state {job.state.name}.", file=sys.stderr)
+                return [None] * len(structures)
+            
+            results = []
+            for response in job.responses:
+                try:
+                    patterns = parse_exclude_patterns(response.text.strip())
+                    results.append(set(patterns) if patterns else None)
+                except Exception:
+                    results.append(None)
+            return results
+        except Exception as e:
+            print(f"Batch API unavailable ({e}); falling back to concurrent calls.", file=sys.stderr)
+            return await self.generate_patterns_batch(structures)
+    
+    def _cache_path(self, prompt: str) -> Path:
+        """Return the cache file path for a rendered prompt.
+
+        SYSTEM_PROMPT is part of the key even though it travels as the
+        model's system_instruction rather than in the prompt text:
+        revising it changes the output, so it must invalidate the cache.
+        """
+        key = hashlib.blake2b(
+            (self.model_name + SYSTEM_PROMPT + prompt).encode(), digest_size=16
+        ).hexdigest()
+        return _CACHE_DIR / f"{key}.json"
+    
+    @staticmethod
+    def _read_cache(path: Path) -> Optional[set[str]]:
+        """Load a cached pattern set, or None on miss/corruption."""
+        try:
+            patterns = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        return set(patterns) if patterns else None
+    
+    @staticmethod
+    def _write_cache(path: Path, patterns: set[str]) -> None:
+        """Best-effort write-through of a generated pattern set."""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(sorted(patterns)))
+        except OSError as e:
+            print(f"Warning: could not write pattern cache: {e}", file=sys.stderr)
+    
+    @staticmethod
+    async def _receive_streaming(generate_async, prompt: str) -> str:
+        """Consume a streamed response, assembling text as chunks arrive.
+
+        Receiving chunk-by-chunk overlaps network receive with response
+        decoding and keeps the event loop responsive during generation;
+        for these one-line pattern responses the chunks are simply
+        accumulated and parsed once complete.
+        """
+        response = await generate_async(prompt, stream=True)
+        chunks = []
+        async for chunk in response:
+            chunks.append(chunk.text)
+        return "".join(chunks).strip()
     
     def _configure_api(self) -> bool:
         """Configure Gemini API with key."""
+        if self.model is not None:
+            return True
         try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(
-                model_name=self.model_name,
-                system_instruction=SYSTEM_PROMPT,
-                generation_config={
-                    "temperature": 0.1,
-                    "max_output_tokens": 1024,
-                }
-            )
+            self.model = _get_model(self.api_key, self.model_name)
             return True
         except Exception as e:
             print(f"Error configuring Gemini API: {e}", file=sys.stderr)
             return False
     
     @staticmethod
-    def _create_prompt(directory_structure: str) -> str:
+    def _prescan_and_reduce(structure: str) -> tuple[set[str], str]:
+        """Scan the tree once for unambiguous exclusions and shrink it.
+
+        A single splitlines pass both emits patterns for well-known noise
+        (VCS metadata, caches, dependency dirs) and drops those lines --
+        plus their elision markers -- from the structure handed to Gemini,
+        so the model never spends input tokens on entries the prescan has
+        already settled. The static patterns survive even when the Gemini
+        call fails or is disabled.
+        """
+        found = set()
+        kept_lines = []
+        skip_elision = False
+        for line in structure.splitlines(keepends=True):
+            if skip_elision:
+                skip_elision = False
+                if line.strip().endswith("└── …"):
+                    continue
+            name = line.rsplit("── ", 1)[-1].strip()
+            is_dir = name.endswith("/")
+            if is_dir:
+                name = name[:-1]
+            pattern = _STATIC_EXCLUDES.get(name)
+            if pattern is not None:
+                found.add(pattern)
+                skip_elision = is_dir
+                continue
+            kept_lines.append(line)
+        return found, "".join(kept_lines)
+    
+    @staticmethod
+    def _create_prompt(directory_structure: Union[str, Iterable[str]]) -> str:
         """Create prompt for Gemini API."""
-        return (
-            f"Analyze the following directory structure and generate a single comma-separated "
-            f"line of exclude patterns based *only* on the items present. Follow the exclusion "
-            f"guidelines strictly.\n\n"
-            f"Directory structure:\n```\n{directory_structure}\n```\n\n"
-            f"Exclude patterns:"
-        )
+        if isinstance(directory_structure, str):
+            return _PROMPT_PREFIX + directory_structure + _PROMPT_SUFFIX
+        return "".join([_PROMPT_PREFIX, *directory_structure, _PROMPT_SUFFIX])
     
     async def _call_api(self, prompt: str) -> Optional[set[str]]:
         """Call Gemini API and parse response."""
-        response = self.model.generate_content(prompt)
-        raw_text = response.text.strip()
+        generate_async = getattr(self.model, "generate_content_async", None)
+        if generate_async is not None:
+            raw_text = await asyncio.wait_for(
+                self._receive_streaming(generate_async, prompt),
+                timeout=_REQUEST_TIMEOUT
+            )
+        else:
+            response = await asyncio.wait_for(
+                asyncio.to_thread(self.model.generate_content, prompt),
+                timeout=_REQUEST_TIMEOUT
+            )
+            raw_text = response.text.strip()
         
         print(f"Gemini Raw Response:\n---\n{raw_text}\n---")
         
         try:
-            parsed_patterns = ExcludePatterns(patterns=raw_text)
-            if parsed_patterns.patterns:
-                return set(parsed_patterns.patterns)
+            patterns = parse_exclude_patterns(raw_text)
+            if patterns:
+                return set(patterns)
             else:
                 print("Warning: Gemini returned an empty pattern list.")
                 return None
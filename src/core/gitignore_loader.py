@@ -0,0 +1,45 @@
+"""Translate a repository's own .gitignore into exclude patterns."""
+
+from pathlib import Path
+from typing import Union
+
+# A .gitignore larger than this is almost certainly generated or broken;
+# reading it wholesale would bloat the pattern set for no gain.
+_MAX_GITIGNORE_BYTES = 1_000_000
+
+
+def load_gitignore(root: Union[str, Path]) -> set:
+    """Return exclude patterns derived from <root>/.gitignore.
+
+    The repo already enumerates its build artifacts there, so feeding
+    them straight into the exclude set saves Gemini from re-deriving
+    them and keeps gitingest from traversing the matched subtrees.
+
+    Only the subset of gitignore syntax that maps cleanly onto
+    gitingest's glob excludes is translated: comments and blank lines
+    are skipped, negations ("!pattern") are dropped because a flat
+    exclude set cannot re-include files, leading "/" anchors become
+    root-relative patterns, and bare names gain a "**/" prefix to match
+    at any depth (mirroring gitignore semantics).
+    """
+    gitignore = Path(root) / ".gitignore"
+    try:
+        if gitignore.stat().st_size > _MAX_GITIGNORE_BYTES:
+            return set()
+        lines = gitignore.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return set()
+
+    patterns = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(("#", "!")):
+            continue
+        if line.startswith("/"):
+            patterns.add(line[1:])
+        elif "/" in line.rstrip("/"):
+            # Contains an inner slash: already anchored to the root.
+            patterns.add(line)
+        else:
+            patterns.add("**/" + line)
+    return patterns
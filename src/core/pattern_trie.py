@@ -0,0 +1,80 @@
+"""Prefix-trie matcher for exclude patterns.
+
+gitingest fnmatches every file against every pattern, which is
+O(files x patterns). Most generated excludes are literal directory
+paths ("dist/", "docs/_build") or any-depth names ("**/__pycache__/"),
+and those can be answered in O(path depth) from a trie plus a set
+lookup; only genuinely wildcarded patterns fall back to fnmatch.
+"""
+
+import fnmatch
+
+# Dict key marking "a pattern terminates at this trie node"; everything
+# under a terminal node is considered matched.
+_TERMINAL = None
+
+
+class PatternTrie:
+    """Matches relative paths against a set of exclude patterns."""
+
+    __slots__ = ("_root", "_any_names", "_globs")
+
+    def __init__(self, patterns=()):
+        self._root = {}
+        # Literal names from "**/name" patterns, matched against every
+        # path component.
+        self._any_names = set()
+        # Wildcarded leftovers, fnmatched as before.
+        self._globs = []
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str) -> None:
+        """Index one pattern (trailing "/" directory markers are accepted)."""
+        cleaned = pattern.strip().rstrip("/")
+        if not cleaned:
+            return
+
+        if cleaned.startswith("**/"):
+            name = cleaned[3:]
+            if "/" not in name and self._is_literal(name):
+                self._any_names.add(name)
+            else:
+                self._globs.append(cleaned)
+            return
+
+        if self._is_literal(cleaned):
+            node = self._root
+            for part in cleaned.split("/"):
+                node = node.setdefault(part, {})
+            node[_TERMINAL] = True
+        else:
+            self._globs.append(cleaned)
+
+    def matches(self, rel_path: str) -> bool:
+        """Return True if rel_path (or any parent of it) is excluded."""
+        parts = rel_path.strip("/").split("/")
+
+        if self._any_names:
+            for part in parts:
+                if part in self._any_names:
+                    return True
+
+        node = self._root
+        for part in parts:
+            node = node.get(part)
+            if node is None:
+                break
+            if _TERMINAL in node:
+                return True
+
+        for pattern in self._globs:
+            if fnmatch.fnmatch(rel_path, pattern):
+                return True
+            if "/" not in pattern and fnmatch.fnmatch(parts[-1], pattern):
+                return True
+        return False
+
+    @staticmethod
+    def _is_literal(s: str) -> bool:
+        return not any(c in s for c in "*?[")
@@ -1,38 +1,117 @@
 """Repository handling for Smart Ingest."""
 
 import asyncio
+import functools
+import hashlib
+import os
+import shutil
 import subprocess
+import sys
 import tempfile
+from pathlib import Path
 from typing import Optional, Tuple
 
+# Persistent clone cache (opt-in via --repo-cache), keyed by URL+branch.
+_REPO_CACHE_DIR = Path(
+    os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
+) / "smart-ingest" / "repos"
+
+
+@functools.lru_cache(maxsize=1)
+def _get_pygit2():
+    """Return the pygit2 module if installed, else None.
+
+    libgit2 clones in-process (no fork/exec, no pipe parsing); pygit2 is
+    optional and the subprocess path remains the universal fallback.
+    """
+    try:
+        import pygit2
+    except ImportError:
+        return None
+    return pygit2
+
 
 class RepositoryHandler:
     """Handles repository cloning operations."""
-    
+
     @staticmethod
-    async def clone_repo(repo_url: str, target_dir: str, branch: Optional[str] = None) -> bool:
-        """Clone a Git repository."""
+    async def clone_repo(repo_url: str, target_dir: str, branch: Optional[str] = None, bare: bool = False) -> bool:
+        """Clone a Git repository.
+
+        Attempts a shallow, single-branch partial clone first
+        (--filter=blob:none skips historical blobs the analysis never
+        reads); servers without partial-clone support get a plain shallow
+        clone as fallback. The clone is only ever read, never pushed to.
+
+        With bare=True, a checkout-less metadata-only clone is made
+        (--bare --filter=blob:none): no working tree is written and no
+        blobs are fetched at all. Dry runs use this, since pattern
+        generation only needs the tree listing.
+        """
         print(f"Cloning '{repo_url}'" + (f" (branch: {branch})" if branch else "") + f" into '{target_dir}'...")
-        
-        cmd = ["git", "clone", "--depth", "1", "--quiet"]
+
+        if bare:
+            base_cmd = ["git", "clone", "--bare", "--depth", "1", "--quiet"]
+            if branch:
+                base_cmd.extend(["-b", branch])
+            base_cmd.extend([repo_url, target_dir])
+            # blob:none (not tree:0): tree objects must be local for the
+            # ls-tree listing, only file contents are skippable.
+            partial_cmd = base_cmd[:2] + ["--filter=blob:none"] + base_cmd[2:]
+            try:
+                returncode, stderr = await RepositoryHandler._run_clone(partial_cmd)
+                if returncode != 0:
+                    # Same degradation as the working-tree path: old git
+                    # clients and servers without partial-clone support
+                    # reject --filter.
+                    print("Partial bare clone failed; retrying without the blob filter...", file=sys.stderr)
+                    returncode, stderr = await RepositoryHandler._run_clone(base_cmd)
+            except FileNotFoundError:
+                print("Error: 'git' command not found. Please ensure Git is installed and in your PATH.", file=sys.stderr)
+                return False
+            if returncode == 0:
+                print("Cloning successful (bare, metadata only).")
+                return True
+            print(f"Error cloning repository (Return Code: {returncode}):", file=sys.stderr)
+            print(f"Stderr: {stderr.decode().strip()}", file=sys.stderr)
+            return False
+
+        pygit2 = _get_pygit2()
+        if pygit2 is not None:
+            try:
+                await asyncio.to_thread(
+                    pygit2.clone_repository,
+                    repo_url,
+                    target_dir,
+                    checkout_branch=branch,
+                    depth=1,
+                )
+                print("Cloning successful.")
+                return True
+            except Exception as e:
+                # Older pygit2 without depth=, unsupported URL schemes, etc.
+                print(f"pygit2 clone failed ({e}); falling back to git subprocess.", file=sys.stderr)
+
+        base_cmd = ["git", "clone", "--depth", "1", "--quiet"]
         if branch:
-            cmd.extend(["-b", branch])
-        cmd.append(repo_url)
-        cmd.append(target_dir)
-        
+            base_cmd.extend(["-b", branch])
+        base_cmd.append(repo_url)
+        base_cmd.append(target_dir)
+
+        partial_cmd = base_cmd[:2] + ["--filter=blob:none", "--single-branch"] + base_cmd[2:]
+
         try:
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode == 0:
+            returncode, stderr = await RepositoryHandler._run_clone(partial_cmd)
+
+            if returncode != 0:
+                print("Partial clone failed; retrying with a plain shallow clone...", file=sys.stderr)
+                returncode, stderr = await RepositoryHandler._run_clone(base_cmd)
+
+            if returncode == 0:
                 print("Cloning successful.")
                 return True
             else:
-                print(f"Error cloning repository (Return Code: {process.returncode}):", file=sys.stderr)
+                print(f"Error cloning repository (Return Code: {returncode}):", file=sys.stderr)
                 print(f"Stderr: {stderr.decode().strip()}", file=sys.stderr)
                 return False
         except FileNotFoundError:
@@ -41,8 +120,67 @@ class RepositoryHandler:
         except Exception as e:
             print(f"An unexpected error occurred during cloning: {e}", file=sys.stderr)
             return False
-    
+
+    async def get_or_update_repo(self, repo_url: str, branch: Optional[str] = None) -> Optional[str]:
+        """Return a cached clone of repo_url, refreshing it via fetch.
+
+        Repeat ingests of the same URL+branch skip the clone entirely: an
+        existing cache entry is updated with a shallow fetch + hard reset,
+        which moves far fewer bytes than a fresh clone. Returns the cache
+        path, or None when neither reuse nor a fresh clone works (callers
+        then fall back to the temp-directory flow).
+        """
+        key = hashlib.sha1(f"{repo_url}\x00{branch or ''}".encode()).hexdigest()
+        cache_dir = _REPO_CACHE_DIR / key
+
+        if (cache_dir / ".git").exists():
+            print(f"Reusing cached clone: {cache_dir}")
+            fetch_ref = branch or "HEAD"
+            returncode, stderr = await self._run_clone(
+                ["git", "-C", str(cache_dir), "fetch", "--depth=1", "--quiet", "origin", fetch_ref]
+            )
+            if returncode == 0:
+                returncode, stderr = await self._run_clone(
+                    ["git", "-C", str(cache_dir), "reset", "--hard", "--quiet", "FETCH_HEAD"]
+                )
+            if returncode != 0:
+                print(f"Warning: could not refresh cached clone, using as-is: {stderr.decode().strip()}", file=sys.stderr)
+            return str(cache_dir)
+
+        cache_dir.parent.mkdir(parents=True, exist_ok=True)
+        if await self.clone_repo(repo_url, str(cache_dir), branch):
+            return str(cache_dir)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return None
+
+    # How much stderr to keep for error reporting; the stream is drained
+    # fully either way so git never blocks on a full pipe.
+    _STDERR_KEEP = 65536
+
+    @staticmethod
+    async def _run_clone(cmd: list) -> Tuple[int, bytes]:
+        """Run a git clone command and return (returncode, stderr).
+
+        stdout is unused and goes straight to /dev/null instead of being
+        buffered through Python; stderr retention is capped so a warning-
+        heavy clone can't balloon memory.
+        """
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        kept = b""
+        while True:
+            chunk = await process.stderr.read(RepositoryHandler._STDERR_KEEP)
+            if not chunk:
+                break
+            if len(kept) < RepositoryHandler._STDERR_KEEP:
+                kept += chunk
+        await process.wait()
+        return process.returncode, kept
+
     @staticmethod
     def create_temp_directory() -> tempfile.TemporaryDirectory:
         """Create a temporary directory for repository cloning."""
-        return tempfile.TemporaryDirectory(prefix="smart_ingest_clone_")
\ No newline at end of file
+        return tempfile.TemporaryDirectory(prefix="smart_ingest_clone_")
@@ -2,16 +2,19 @@
 
 import argparse
 import asyncio
-import os # <-- Add os import
+import functools
+import os
 import sys
 from pathlib import Path
 from typing import Optional
 
 sys.path.append(str(Path(__file__).parent))
 
-from gitingest import ingest_async
+from core.common_ignores import COMMON_IGNORES
 from core.directory_analyzer import DirectoryAnalyzer
 from core.gemini_client import GeminiExcludePatternGenerator
+from core.gitignore_loader import load_gitignore
+from core.pattern_trie import PatternTrie
 from core.repository_handler import RepositoryHandler
 from config import Config, load_config
 
@@ -22,19 +25,30 @@ class SmartIngestApp:
     def __init__(self, config: Config):
         self.config = config
         self.exclude_patterns: set[str] = set()
+        # True when the prepared source is a bare clone (dry runs): there
+        # is no working tree, so analysis reads git metadata instead.
+        self._bare_source = False
+        # Informational stdout lines queued by _emit and written in one
+        # batch at phase boundaries; see _flush.
+        self._out_buf: list[str] = []
         self.repo_handler = RepositoryHandler()
-        self.analyzer = DirectoryAnalyzer(max_depth=config.max_depth)
+        self.analyzer = DirectoryAnalyzer(
+            max_depth=config.max_depth,
+            max_entries=config.max_entries,
+            max_bytes=config.max_tree_bytes
+        )
         
         if config.api_key:
             self.gemini_client = GeminiExcludePatternGenerator(
                 api_key=config.api_key,
                 model_name=config.gemini_model,
-                retries=config.retries
+                retries=config.retries,
+                use_cache=config.use_cache
             )
         else:
             self.gemini_client = None
-            if not config.api_key and not getattr(parse_arguments(), 'no_auto_exclude', False): # Check if auto-exclude was intended
-                 print("Warning: No Gemini API key provided. Automatic exclude pattern generation is disabled.", file=sys.stderr)
+            if not config.no_auto_exclude: # Check if auto-exclude was intended
+                print("Warning: No Gemini API key provided. Automatic exclude pattern generation is disabled.", file=sys.stderr)
 
 
     async def run(self, args: argparse.Namespace) -> None:
@@ -42,7 +56,18 @@ class SmartIngestApp:
         source = args.source
         is_url = self._is_repository_url(source)
         
-        local_source_path, temp_dir = await self._prepare_source(source, is_url, args.branch)
+        prepare_task = asyncio.ensure_future(
+            self._prepare_source(source, is_url, args.branch, dry_run=args.dry_run)
+        )
+        if self.gemini_client and not args.no_auto_exclude:
+            # Configure the Gemini SDK while the clone (for URL sources) is
+            # in flight; both are independent network/IO work.
+            (local_source_path, temp_dir), _ = await asyncio.gather(
+                prepare_task,
+                asyncio.to_thread(self.gemini_client.configure)
+            )
+        else:
+            local_source_path, temp_dir = await prepare_task
         
         try:
             if Path(local_source_path).is_dir(): # Only analyze if it's a directory
@@ -55,21 +80,26 @@ class SmartIngestApp:
 
             if args.dry_run:
                 if not Path(local_source_path).is_dir() and not args.no_auto_exclude:
-                    print("Skipping pattern display as source is not a directory and auto-excludes were skipped.")
+                    self._emit("Skipping pattern display as source is not a directory and auto-excludes were skipped.")
                 elif self.exclude_patterns:
                     self._display_patterns(self.exclude_patterns, "Final Exclude Patterns (Dry Run):")
                 else:
-                    print("\nFinal Exclude Patterns (Dry Run):")
-                    print("  (None - either no patterns generated or auto-generation disabled/skipped)")
-                print("\nDry run requested. Exiting without performing ingestion.")
+                    self._emit("\nFinal Exclude Patterns (Dry Run):")
+                    self._emit("  (None - either no patterns generated or auto-generation disabled/skipped)")
+                self._emit("\nDry run requested. Exiting without performing ingestion.")
                 return
             
             await self._execute_gitingest(local_source_path, args, is_url)
             
         finally:
+            self._flush()
             if temp_dir:
                 print(f"Cleaning up temporary directory: {temp_dir.name}")
-                temp_dir.cleanup()
+                # Deleting a large clone is thousands of unlink syscalls;
+                # run it on a worker thread so the loop (and any pending
+                # callbacks) aren't stalled behind it. Cached clones
+                # (--repo-cache) skip the tempdir entirely.
+                await asyncio.to_thread(temp_dir.cleanup)
     
     @staticmethod
     def _is_repository_url(source: str) -> bool:
@@ -77,19 +107,29 @@ class SmartIngestApp:
         return source.startswith(("http://", "https://", "git@"))
     
     async def _prepare_source(
-        self, 
-        source: str, 
-        is_url: bool, 
-        branch: Optional[str]
+        self,
+        source: str,
+        is_url: bool,
+        branch: Optional[str],
+        dry_run: bool = False
     ) -> tuple[str, Optional[object]]:
         """Prepare local source path and handle temporary directory if needed."""
         if is_url:
+            if self.config.repo_cache:
+                if cached_path := await self.repo_handler.get_or_update_repo(source, branch):
+                    # Cached clones persist across runs; nothing to clean up.
+                    return cached_path, None
+                print("Warning: repo cache unavailable, falling back to a temporary clone.", file=sys.stderr)
+
             temp_dir_obj = self.repo_handler.create_temp_directory()
             # On Python 3.8+, TemporaryDirectory has a .name attribute which is a string.
             # For older versions or type hinting, ensure it's treated as a string.
             local_path = str(temp_dir_obj.name)
-            
-            if not await self.repo_handler.clone_repo(source, local_path, branch):
+
+            # Dry runs never ingest file contents, so a bare metadata-only
+            # clone suffices: no checkout, no blobs fetched.
+            self._bare_source = dry_run
+            if not await self.repo_handler.clone_repo(source, local_path, branch, bare=dry_run):
                 temp_dir_obj.cleanup() # Clean up if clone fails
                 sys.exit(1)
                 
@@ -108,15 +148,34 @@ class SmartIngestApp:
         args: argparse.Namespace
     ) -> set[str]:
         """Generate and combine exclude patterns."""
-        patterns = set(args.exclude_pattern or []) # Ensure it's a list if None
-        
+        # Seed with the baked-in common ignores so the obvious excludes
+        # apply even when auto-exclude is off or Gemini fails.
+        patterns = set(args.exclude_pattern or []) | COMMON_IGNORES
+
+        # The repo's own .gitignore already names its build artifacts;
+        # honoring it costs one small file read.
+        if gitignore_patterns := load_gitignore(local_source_path):
+            self._emit(f"Loaded {len(gitignore_patterns)} exclude patterns from .gitignore")
+            patterns.update(gitignore_patterns)
+
         if not args.no_auto_exclude and self.gemini_client:
             auto_patterns = await self._generate_auto_exclude_patterns(local_source_path, args)
             patterns.update(auto_patterns)
+        elif args.show_tree:
+            # Auto-exclude is off (flag or missing API key), so no walk is
+            # needed for pattern generation -- but honor --show-tree.
+            self._emit("\n--- Directory Tree ---")
+            if self._bare_source:
+                self._emit(self.analyzer.create_directory_tree_from_git(local_source_path))
+            else:
+                self._emit(self.analyzer.create_directory_tree(local_source_path))
+            self._emit("--- End Tree ---\n")
         
         # Display patterns here if not dry run, or let dry run handle it
         if not args.dry_run:
             self._display_patterns(patterns)
+        # Phase boundary: pattern generation is done.
+        self._flush()
         return patterns
     
     async def _generate_auto_exclude_patterns(
@@ -125,39 +184,126 @@ class SmartIngestApp:
         args: argparse.Namespace
     ) -> set[str]:
         """Generate automatic exclude patterns using Gemini."""
-        print(f"Analyzing directory structure: {local_source_path}")
-        
-        directory_tree = self.analyzer.create_directory_tree(local_source_path)
+        self._emit(f"Analyzing directory structure: {local_source_path}")
         
+        if self._bare_source:
+            # Bare clones have no working tree; list HEAD from git metadata.
+            directory_tree = await asyncio.to_thread(
+                self.analyzer.create_directory_tree_from_git, local_source_path
+            )
+        else:
+            # The parallel walk overlaps per-directory listing I/O; the result
+            # is already bounded by the analyzer's entry/byte budget.
+            directory_tree = await self.analyzer.create_directory_tree_async(local_source_path)
+
         if args.show_tree:
-            print("\n--- Directory Tree ---")
-            print(directory_tree)
-            print("--- End Tree ---\n")
+            self._emit("\n--- Directory Tree ---")
+            self._emit(directory_tree)
+            self._emit("--- End Tree ---\n")
+        
+        if "tree truncated" in directory_tree and not self._bare_source:
+            # The full tree blew the budget; a histogram summary preserves
+            # the whole structure at a fraction of the tokens.
+            self._emit("Tree exceeds the analysis budget; using a compacted summary for Gemini.")
+            directory_tree = await asyncio.to_thread(
+                self.analyzer.create_directory_summary, local_source_path
+            )
         
+        if self.analyzer.last_walk_complete:
+            n_dirs = sum(1 for _, is_dir in self.analyzer.last_walk_paths if is_dir)
+            n_files = len(self.analyzer.last_walk_paths) - n_dirs
+            if n_files < 50 and n_dirs < 10:
+                # A repo this small has nothing worth excluding beyond the
+                # seeded common ignores; skip the Gemini round-trip.
+                self._emit(f"Small repository ({n_files} files, {n_dirs} directories); skipping Gemini pattern generation.")
+                return set()
+
         if not self.gemini_client: # Should have been caught earlier, but defensive check
             print("Gemini client not available. Skipping automatic pattern generation.", file=sys.stderr)
             return set()
 
-        print(f"Generating intelligent exclude patterns using Gemini ({self.config.gemini_model})...")
+        self._emit(f"Generating intelligent exclude patterns using Gemini ({self.config.gemini_model})...")
+        # Show progress before the potentially long network wait.
+        self._flush()
         
         if auto_patterns := await self.gemini_client.generate_patterns(directory_tree):
-            print("\nAutomatically generated exclude patterns:")
+            self._emit("\nAutomatically generated exclude patterns:")
             for pattern in sorted(auto_patterns):
-                print(f"  - {pattern}")
+                self._emit(f"  - {pattern}")
             return auto_patterns
         else:
-            print("\nFailed to generate or no automatic exclude patterns returned. Using manual patterns only if provided.")
+            self._emit("\nFailed to generate or no automatic exclude patterns returned. Using manual patterns only if provided.")
             return set()
     
     @staticmethod
-    def _display_patterns(patterns: set[str], title: str = "Final Exclude Patterns:") -> None:
-        """Display final exclude patterns."""
-        print(f"\n{title}")
+    def _normalize_patterns(patterns: set[str]) -> set[str]:
+        """Drop exclude patterns subsumed by a broader recursive glob.
+
+        Gemini plus manual input can yield overlaps like '**/__pycache__/'
+        alongside 'src/__pycache__/'; gitingest fnmatches every file
+        against every pattern, so shedding redundant ones shrinks that
+        O(files x patterns) work.
+        """
+        recursive_suffixes = {p[3:] for p in patterns if p.startswith("**/")}
+        normalized = set()
+        for pattern in patterns:
+            if not pattern.startswith("**/") and any(
+                pattern == suffix or pattern.endswith("/" + suffix)
+                for suffix in recursive_suffixes
+            ):
+                continue
+            normalized.add(pattern)
+        return normalized
+    
+    def _prefilter_files(self, local_source_path: str, exclude_patterns: set[str]) -> Optional[set[str]]:
+        """Resolve a large exclude set to the explicit files it leaves alive.
+
+        Reuses the analyzer's recorded walk instead of re-scanning, and
+        matches each file once against a trie of the excludes. Returns
+        None whenever the walk can't be trusted as the full file
+        universe (truncated/absent walk, or paths containing glob
+        metacharacters that gitingest would misread as patterns), in
+        which case the caller falls back to plain exclude matching.
+        """
+        if not self.analyzer.last_walk_complete or not self.analyzer.last_walk_paths:
+            return None
+
+        trie = PatternTrie(exclude_patterns)
+        survivors = set()
+        for path, is_dir in self.analyzer.last_walk_paths:
+            if is_dir:
+                continue
+            rel_path = os.path.relpath(path, local_source_path)
+            if any(c in rel_path for c in "*?["):
+                return None
+            if not trie.matches(rel_path):
+                survivors.add(rel_path)
+        return survivors or None
+
+    def _emit(self, message: str = "") -> None:
+        """Queue an informational line for the next _flush.
+
+        Batching informational output into one write per phase keeps the
+        event loop from serializing on line-buffered stdout during the
+        async sections; warnings and errors still hit stderr immediately.
+        """
+        self._out_buf.append(message)
+
+    def _flush(self) -> None:
+        """Write all queued lines to stdout in a single call."""
+        if self._out_buf:
+            sys.stdout.write("\n".join(self._out_buf) + "\n")
+            sys.stdout.flush()
+            self._out_buf.clear()
+
+    def _display_patterns(self, patterns: set[str], title: str = "Final Exclude Patterns:") -> None:
+        """Queue the final exclude patterns for display."""
+        self._emit(f"\n{title}")
         if patterns:
             for pattern in sorted(patterns):
-                print(f"  - {pattern}")
+                self._emit(f"  - {pattern}")
         else:
-            print("  (None)")
+            self._emit("  (None)")
     
     @staticmethod
     def _generate_default_output_filename(original_source_str: str) -> str:
@@ -184,74 +330,80 @@ class SmartIngestApp:
         is_url: bool 
     ) -> None:
         """Execute GitIngest with configured parameters."""
+        # gitingest is a heavy import; defer it until ingestion actually runs
+        # so --help and --dry-run never pay for it.
+        from gitingest import ingest_async
         
         # Resolve output file path to an absolute path based on the original CWD
         output_filename_default = self._generate_default_output_filename(args.source)
         output_file_path_str = args.output or output_filename_default
         output_file_absolute = str(Path(output_file_path_str).resolve())
 
-        print(f"\nRunning GitIngest on: {local_source_path}")
-        print(f"Output file: {output_file_absolute}")
-        print(f"Max file size: {args.max_size} bytes")
+        self._emit(f"\nRunning GitIngest on: {local_source_path}")
+        self._emit(f"Output file: {output_file_absolute}")
+        self._emit(f"Max file size: {args.max_size} bytes")
         
         if args.include_pattern:
-            print(f"Include patterns: {', '.join(sorted(args.include_pattern))}")
-        
-        original_cwd = os.getcwd()
-        # Target path for gitingest (where it should effectively 'cd' to)
-        gitingest_target_dir = local_source_path 
-        # Argument for gitingest's source parameter
-        gitingest_source_arg = local_source_path # Default: pass absolute path
+            self._emit(f"Include patterns: {', '.join(sorted(args.include_pattern))}")
         
-        # Determine if we can and should chdir
-        can_chdir = Path(gitingest_target_dir).is_dir()
-
+        # local_source_path is always absolute (resolved in _prepare_source),
+        # so gitingest is handed the path directly. Changing the process-wide
+        # working directory here would race any concurrent task that touches
+        # relative paths, and buys nothing.
         try:
-            if can_chdir:
-                print(f"Changing working directory to: {gitingest_target_dir} for GitIngest execution.")
-                os.chdir(gitingest_target_dir)
-                gitingest_source_arg = "." # Run with source as "." relative to the new CWD
-            else:
-                print(f"Source '{gitingest_target_dir}' is not a directory. Running GitIngest with absolute path.")
-
-
             # Determine branch argument for gitingest
             # If the source was a URL, smart-ingest already cloned the specified branch (or default).
             # gitingest's branch argument is for *its* cloning or for local repo branch switching.
             # If it was a local path, args.branch could specify a different branch for gitingest to process.
-            gitingest_branch_arg = args.branch if not is_url and Path(gitingest_target_dir).is_dir() else None
-            
+            gitingest_branch_arg = args.branch if not is_url and Path(local_source_path).is_dir() else None
+
             # Ensure exclude_patterns is a set, even if empty.
             # self.exclude_patterns is initialized as set(), so it should be fine.
-            current_exclude_patterns = self.exclude_patterns if self.exclude_patterns else set()
+            current_exclude_patterns = self._normalize_patterns(self.exclude_patterns) if self.exclude_patterns else set()
 
+            include_patterns = set(args.include_pattern) if args.include_pattern else None
+            if include_patterns is None and len(current_exclude_patterns) > 50:
+                if survivors := self._prefilter_files(local_source_path, current_exclude_patterns):
+                    # The analyzer's walk already decided each file's
+                    # fate; handing gitingest the explicit survivor list
+                    # replaces its O(files x patterns) fnmatch pass.
+                    self._emit(f"Pre-filtered {len(current_exclude_patterns)} exclude patterns down to {len(survivors)} files to ingest.")
+                    include_patterns = survivors
+                    current_exclude_patterns = set()
+
+            # Phase boundary: everything queued so far goes out before the
+            # long-running ingestion starts.
+            self._flush()
 
             summary, _, _ = await ingest_async(
-                source=gitingest_source_arg,
+                source=local_source_path,
                 max_file_size=args.max_size,
-                include_patterns=set(args.include_pattern) if args.include_pattern else None,
+                include_patterns=include_patterns,
                 exclude_patterns=current_exclude_patterns if current_exclude_patterns else None,
                 branch=gitingest_branch_arg,
                 output=output_file_absolute # Use the absolute path for output
             )
             
-            print(f"\nAnalysis complete! Output written to: {output_file_absolute}")
-            print("\nSummary:")
-            print(summary)
+            self._emit(f"\nAnalysis complete! Output written to: {output_file_absolute}")
+            self._emit("\nSummary:")
+            self._emit(summary)
+            self._flush()
             
         except Exception as e:
             print(f"\nError running GitIngest: {str(e)}", file=sys.stderr)
             # Re-raise the exception so it's not silently swallowed,
             # allowing the main try/except or asyncio to handle it.
             raise
-        finally:
-            if can_chdir: # Only chdir back if we chdir'd in the first place
-                print(f"Restoring original working directory: {original_cwd}")
-                os.chdir(original_cwd)
 
 
-def parse_arguments() -> argparse.Namespace:
-    """Parse command line arguments."""
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser once per process.
+
+    Constructing the parser registers every add_argument call; caching it
+    keeps repeat parses (and any in-process reuse) from paying that cost
+    again.
+    """
     parser = argparse.ArgumentParser(
         description="Enhanced GitIngest with Gemini-powered automatic exclude pattern generation"
     )
@@ -271,14 +423,27 @@ def parse_arguments() -> argparse.Namespace:
                         help="Disable automatic exclude pattern generation via Gemini")
     parser.add_argument("--max-depth", type=int, default=8, 
                         help="Maximum directory traversal depth for analysis tree (default: 8)")
+    parser.add_argument("--max-entries", type=int, default=2000, 
+                        help="Maximum number of entries in the analysis tree sent to Gemini (default: 2000)")
+    parser.add_argument("--max-tree-bytes", type=int, default=64000, 
+                        help="Maximum size in bytes of the analysis tree sent to Gemini (default: 64000)")
     parser.add_argument("--dry-run", action="store_true", 
                         help="Generate and show exclude patterns without performing ingestion")
     parser.add_argument("--show-tree", action="store_true", 
                         help="Show the directory tree used for analysis")
     parser.add_argument("--retries", type=int, default=3, 
                         help="Number of Gemini API call retries (default: 3)")
+    parser.add_argument("--no-cache", action="store_true", 
+                        help="Disable the on-disk cache of Gemini-generated exclude patterns")
+    parser.add_argument("--repo-cache", action="store_true", 
+                        help="Cache cloned repositories across runs (keyed by URL and branch) and refresh them with a shallow fetch")
     
-    return parser.parse_args()
+    return parser
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments."""
+    return _build_parser().parse_args()
 
 
 async def main():
@@ -298,4 +463,12 @@ async def main():
 
 
 if __name__ == "__main__":
+    # uvloop (optional) replaces the default selector loop; the clone
+    # subprocesses and Gemini HTTP calls both benefit from its lower
+    # scheduling overhead. Pure opportunism: absent, nothing changes.
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
\ No newline at end of file